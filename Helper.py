@@ -9,55 +9,90 @@ get_grid_size
 """
 Helper functions for puzzle operations.
 """
-from typing import List, Optional, Dict, Tuple
+from typing import TYPE_CHECKING, Any, List, Optional, Dict, Tuple, Union
+from pathlib import Path
+import json
 import re
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from functools import lru_cache
+import numpy as np
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    from matplotlib.path import Path as MplPath
+    from matplotlib.collections import PathCollection
+    from matplotlib.image import AxesImage
+
+
+# A puzzle matrix is either the legacy list-of-lists form (each cell is
+# [color_num, state]) or a puzzle dict holding 'colors' and 'states' arrays.
+Matrix = Union[List[List[List[int]]], Dict[str, Any]]
+
+
+def _to_arrays(matrix: Matrix) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (colors, states) 2D arrays for either matrix form."""
+    if isinstance(matrix, dict):
+        if "colors" not in matrix and "matrix" in matrix:
+            return _to_arrays(matrix["matrix"])
+        colors = np.asarray(matrix.get("colors", []), dtype=np.uint8)
+        states = matrix.get("states")
+        states = (np.zeros_like(colors, dtype=np.int8) if states is None
+                  else np.asarray(states, dtype=np.int8))
+    else:
+        cells = np.asarray(matrix, dtype=np.int16)
+        if cells.ndim != 3:
+            cells = np.zeros((0, 0, 2), dtype=np.int16)
+        colors = cells[..., 0].astype(np.uint8)
+        states = cells[..., 1].astype(np.int8)
+    if colors.size == 0:
+        return np.zeros((0, 0), dtype=np.uint8), np.zeros((0, 0), dtype=np.int8)
+    return colors, states
 
 
 # ============================================
 # TEXT OUTPUT FUNCTIONS
 # ============================================
 
-def print_matrix(matrix: List[List[List[int]]], show_indices: bool = False) -> None:
+def print_matrix(matrix: Matrix, show_indices: bool = False) -> None:
     """
     Print matrix in a human-readable format.
     
     Args:
-        matrix: 2D matrix where each cell is [color_num, state]
+        matrix: 2D matrix where each cell is [color_num, state],
+                or a puzzle dict with 'colors' and 'states' arrays
         show_indices: If True, show row and column numbers
     
     Example output:
         1 1 2 2
         1 3 2 3
     """
-    if not matrix:
+    colors, _ = _to_arrays(matrix)
+    if colors.size == 0:
         print("Empty matrix")
         return
     
-    rows = len(matrix)
-    cols = len(matrix[0])
+    rows, cols = colors.shape
     
     # Find max width needed for alignment
-    max_val = max(cell[0] for row in matrix for cell in row)
+    max_val = int(colors.max())
     width = len(str(max_val))
+    fmt = f"{{:>{width}}}".format  # format spec parsed once, not per cell
+    
+    lines = []
     
-    # Print column headers if requested
+    # Column headers if requested
     if show_indices:
-        header = "   " + " ".join(f"{c:>{width}}" for c in range(cols))
-        print(header)
-        print("   " + "-" * (len(header) - 3))
-    
-    # Print each row
-    for i, row in enumerate(matrix):
-        values = [f"{cell[0]:>{width}}" for cell in row]
-        if show_indices:
-            print(f"{i:>2}| {' '.join(values)}")
-        else:
-            print(" ".join(values))
+        header = "   " + " ".join(map(fmt, range(cols)))
+        lines.append(header)
+        lines.append("   " + "-" * (len(header) - 3))
+    
+    # One line per row, printed in a single write
+    for i, row in enumerate(colors.tolist()):
+        values = " ".join(map(fmt, row))
+        lines.append(f"{i:>2}| {values}" if show_indices else values)
+    print("\n".join(lines))
 
 
-def print_matrix_state(matrix: List[List[List[int]]], show_indices: bool = False) -> None:
+def print_matrix_state(matrix: Matrix, show_indices: bool = False) -> None:
     """
     Print matrix with state indicators.
     
@@ -70,40 +105,44 @@ def print_matrix_state(matrix: List[List[List[int]]], show_indices: bool = False
         1o 1o 2q 2x
         1o 3q 2o 3x
     """
-    if not matrix:
+    colors, states = _to_arrays(matrix)
+    if colors.size == 0:
         print("Empty matrix")
         return
     
     state_map = {0: 'o', 1: 'q', -1: 'x'}
     
-    rows = len(matrix)
-    cols = len(matrix[0])
+    rows, cols = colors.shape
     
-    max_val = max(cell[0] for row in matrix for cell in row)
+    max_val = int(colors.max())
     width = len(str(max_val)) + 1
+    fmt = f"{{:>{width}}}".format
+    
+    lines = []
     
     if show_indices:
-        header = "   " + " ".join(f"{c:>{width}}" for c in range(cols))
-        print(header)
-        print("   " + "-" * (len(header) - 3))
-    
-    for i, row in enumerate(matrix):
-        values = [f"{cell[0]}{state_map.get(cell[1], '?')}".rjust(width) for cell in row]
-        if show_indices:
-            print(f"{i:>2}| {' '.join(values)}")
-        else:
-            print(" ".join(values))
+        header = "   " + " ".join(map(fmt, range(cols)))
+        lines.append(header)
+        lines.append("   " + "-" * (len(header) - 3))
+    
+    for i, (color_row, state_row) in enumerate(zip(colors.tolist(), states.tolist())):
+        values = " ".join(fmt(f"{color_num}{state_map.get(state, '?')}")
+                          for color_num, state in zip(color_row, state_row))
+        lines.append(f"{i:>2}| {values}" if show_indices else values)
+    print("\n".join(lines))
 
 
-def matrix_to_string(matrix: List[List[List[int]]]) -> str:
+def matrix_to_string(matrix: Matrix) -> str:
     """Convert matrix to a string representation."""
-    if not matrix:
+    colors, _ = _to_arrays(matrix)
+    if colors.size == 0:
         return "Empty matrix"
     
-    max_val = max(cell[0] for row in matrix for cell in row)
+    max_val = int(colors.max())
     width = len(str(max_val))
+    fmt = f"{{:>{width}}}".format
     
-    lines = [" ".join(f"{cell[0]:>{width}}" for cell in row) for row in matrix]
+    lines = [" ".join(map(fmt, row)) for row in colors.tolist()]
     return "\n".join(lines)
 
 
@@ -111,27 +150,89 @@ def matrix_to_string(matrix: List[List[List[int]]]) -> str:
 # UTILITY FUNCTIONS
 # ============================================
 
-def get_grid_size(matrix: List[List[List[int]]]) -> Tuple[int, int]:
+def get_grid_size(matrix: Matrix) -> Tuple[int, int]:
     """Return (rows, cols) of the matrix."""
-    if not matrix:
-        return (0, 0)
-    return (len(matrix), len(matrix[0]))
+    rows, cols = _to_arrays(matrix)[0].shape
+    return (rows, cols)
 
 
-def get_color_count(matrix: List[List[List[int]]]) -> int:
+def get_color_count(matrix: Matrix) -> int:
     """Return the number of unique colors in the matrix."""
-    if not matrix:
-        return 0
-    return len({cell[0] for row in matrix for cell in row})
+    colors, _ = _to_arrays(matrix)
+    return int(np.unique(colors).size)
+
+
+# ============================================
+# STORAGE FUNCTIONS
+# ============================================
+
+def load_npz(npz_path: Union[str, Path]) -> Dict[int, Dict[str, Any]]:
+    """
+    Load puzzles saved by save_npz or return empty dict.
+    
+    Returns:
+        {level: {'colors', 'states', 'color_map'}}; states start as all zeros
+    """
+    npz_path = Path(npz_path)
+    if not npz_path.exists():
+        return {}
+    data = {}
+    with np.load(npz_path) as npz:
+        color_maps = json.loads(str(npz["color_maps"]))
+        for lvl in npz["levels"].tolist():
+            colors = npz[f"c{lvl}"]
+            data[lvl] = {
+                "colors": colors,
+                "states": np.zeros_like(colors, dtype=np.int8),
+                "color_map": color_maps[str(lvl)]
+            }
+    return data
+
+
+def save_npz(npz_path: Union[str, Path], data: Dict[int, Dict[str, Any]]) -> None:
+    """
+    Save puzzles to a compressed npz file: level ids, one uint8 color
+    array per level (key 'c<level>') and all color maps as a JSON string.
+    States are not stored. Legacy 'matrix' entries are converted.
+    """
+    levels = sorted(data)
+    arrays = {f"c{lvl}": _to_arrays(data[lvl])[0] for lvl in levels}
+    color_maps = {str(lvl): data[lvl]["color_map"] for lvl in levels}
+    np.savez_compressed(
+        Path(npz_path),
+        levels=np.array(levels, dtype=np.int32),
+        color_maps=np.array(json.dumps(color_maps)),
+        **arrays
+    )
 
 
 # ============================================
 # RENDERING FUNCTIONS
 # ============================================
 
+@lru_cache(maxsize=None)
+def _get_mpl():
+    """Import matplotlib.pyplot on first render, so text-only use stays fast."""
+    import matplotlib.pyplot as plt
+    return plt
+
+
+_RGB_RE = re.compile(r'rgb\s*\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)')
+
+
+@lru_cache(maxsize=512)
 def _parse_rgb(color_str: str) -> Tuple[float, float, float]:
     """Parse 'rgb(r, g, b)' string to normalized (0-1) tuple for matplotlib."""
-    match = re.search(r'rgb\s*\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)', color_str)
+    # Fast path: plain string split for the usual 'rgb(r, g, b)' form
+    s = color_str.strip()
+    if s.startswith('rgb(') and s.endswith(')'):
+        try:
+            r, g, b = s[4:-1].split(',')
+            return (int(r) / 255, int(g) / 255, int(b) / 255)
+        except ValueError:
+            pass
+    
+    match = _RGB_RE.search(color_str)
     if match:
         return tuple(int(match.group(i)) / 255 for i in (1, 2, 3))
     return (0.5, 0.5, 0.5)
@@ -148,18 +249,111 @@ def _get_text_color(rgb: Tuple[float, float, float]) -> str:
     return 'black' if brightness > 0.5 else 'white'
 
 
+def _build_color_image(
+    colors: np.ndarray,
+    color_lookup: Dict[int, Tuple[float, float, float]]
+) -> np.ndarray:
+    """Map color numbers to a (rows, cols, 3) RGB image via a lookup table."""
+    max_color = max(int(colors.max()), max(color_lookup, default=0))
+    lut = np.full((max_color + 1, 3), 0.5, dtype=np.float32)
+    for num, rgb in color_lookup.items():
+        lut[num] = rgb
+    return lut[colors]
+
+
+def _draw_cells(
+    ax: 'plt.Axes',
+    colors: np.ndarray,
+    color_lookup: Dict[int, Tuple[float, float, float]],
+    show_grid: bool
+) -> 'AxesImage':
+    """Draw all cells as a single image and set up the axes around it."""
+    rows, cols = colors.shape
+    image = ax.imshow(_build_color_image(colors, color_lookup), extent=(0, cols, 0, rows),
+                      interpolation='nearest', origin='upper')
+    ax.set_xlim(0, cols)
+    ax.set_ylim(0, rows)
+    ax.set_aspect('equal')
+    
+    if show_grid:
+        ax.set_xticks(np.arange(cols + 1))
+        ax.set_yticks(np.arange(rows + 1))
+        ax.tick_params(length=0, labelbottom=False, labelleft=False)
+        ax.grid(True, color='black', linewidth=0.5)
+        for spine in ax.spines.values():
+            spine.set_linewidth(0.5)
+    else:
+        ax.axis('off')
+    
+    return image
+
+
+@lru_cache(maxsize=None)
+def _symbol_marker(symbol: str) -> 'MplPath':
+    """
+    Bold glyph as a marker path on a shared one-em box, so every symbol drawn
+    with s=font_size ** 2 matches text of that font size.
+    """
+    from matplotlib.font_manager import FontProperties
+    from matplotlib.path import Path as MplPath
+    from matplotlib.textpath import TextPath
+    
+    glyph = TextPath((0, 0), symbol, size=1, prop=FontProperties(weight='bold'))
+    box = glyph.get_extents()
+    verts = glyph.vertices - (box.x0 + box.width / 2, box.y0 + box.height / 2)
+    # Markers are scaled to their largest vertex; two bare MOVETO corners pin
+    # that to the same em box for every glyph without drawing anything
+    verts = np.concatenate([verts, [(-0.5, -0.5), (0.5, 0.5)]])
+    codes = np.concatenate([glyph.codes, [MplPath.MOVETO, MplPath.MOVETO]])
+    return MplPath(verts, codes)
+
+
+def _draw_symbols(
+    ax: 'plt.Axes',
+    colors: np.ndarray,
+    states: np.ndarray,
+    color_lookup: Dict[int, Tuple[float, float, float]],
+    font_size: int
+) -> List['PathCollection']:
+    """Draw Q/X for queen/blocked cells and return the created collections."""
+    rows = colors.shape[0]
+    state_markers = {1: _symbol_marker('Q'), -1: _symbol_marker('X')}
+    collections = []
+    
+    # Text color per color number, computed once per puzzle instead of per cell
+    text_lut = {num: _get_text_color(rgb) for num, rgb in color_lookup.items()}
+    default_text_color = _get_text_color((0.5, 0.5, 0.5))
+    
+    # One scatter (a single PathCollection) per symbol instead of a Text per cell
+    for state, marker in state_markers.items():
+        ii, jj = np.nonzero(states == state)
+        if ii.size == 0:
+            continue
+        text_colors = [text_lut.get(c, default_text_color) for c in colors[ii, jj].tolist()]
+        collections.append(ax.scatter(jj + 0.5, rows - 1 - ii + 0.5, marker=marker,
+                                      s=font_size ** 2, c=text_colors, linewidths=0, zorder=3))
+    
+    return collections
+
+
+def _default_font_size(rows: int, cols: int) -> int:
+    """Font size for Q/X that fits the cells of a rows x cols grid."""
+    return max(8, min(24, int(72 / max(rows, cols))))
+
+
 def render_puzzle(
-    matrix: List[List[List[int]]],
+    matrix: Matrix,
     color_map: Dict[str, int],
     cell_size: float = 1.0,
     show_grid: bool = True,
     figsize: Optional[Tuple[int, int]] = None
-) -> plt.Figure:
+) -> 'plt.Figure':
     """
     Render puzzle as a colored grid image.
     
     Args:
-        matrix: 2D matrix where each cell is [color_num, state]
+        matrix: 2D matrix where each cell is [color_num, state],
+                or a puzzle dict with 'colors' and 'states' arrays
         color_map: Dictionary mapping color strings to color numbers
         cell_size: Size of each cell
         show_grid: If True, show grid lines
@@ -168,53 +362,40 @@ def render_puzzle(
     Returns:
         matplotlib Figure object
     """
-    if not matrix or not color_map:
+    plt = _get_mpl()
+    colors, _ = _to_arrays(matrix)
+    if colors.size == 0 or not color_map:
         fig, ax = plt.subplots()
         ax.text(0.5, 0.5, "Empty puzzle", ha='center', va='center')
         return fig
     
-    rows, cols = len(matrix), len(matrix[0])
+    rows, cols = colors.shape
     color_lookup = _build_color_lookup(color_map)
     
     if figsize is None:
         figsize = (cols * cell_size, rows * cell_size)
     
     fig, ax = plt.subplots(figsize=figsize)
-    
-    # Draw all cells
-    for i in range(rows):
-        for j in range(cols):
-            rgb = color_lookup.get(matrix[i][j][0], (0.5, 0.5, 0.5))
-            rect = patches.Rectangle(
-                (j, rows - 1 - i), 1, 1,
-                linewidth=0.5 if show_grid else 0,
-                edgecolor='black' if show_grid else 'none',
-                facecolor=rgb
-            )
-            ax.add_patch(rect)
-    
-    ax.set_xlim(0, cols)
-    ax.set_ylim(0, rows)
-    ax.set_aspect('equal')
-    ax.axis('off')
+    _draw_cells(ax, colors, color_lookup, show_grid)
     plt.tight_layout()
     
     return fig
 
 
 def render_puzzle_state(
-    matrix: List[List[List[int]]],
+    matrix: Matrix,
     color_map: Dict[str, int],
     cell_size: float = 1.0,
     show_grid: bool = True,
     figsize: Optional[Tuple[int, int]] = None,
     font_size: Optional[int] = None
-) -> plt.Figure:
+) -> 'plt.Figure':
     """
     Render puzzle with state indicators (Q for queen, X for blocked).
     
     Args:
-        matrix: 2D matrix where each cell is [color_num, state]
+        matrix: 2D matrix where each cell is [color_num, state],
+                or a puzzle dict with 'colors' and 'states' arrays
                 state: 0 = empty, 1 = queen (Q), -1 = blocked (X)
         color_map: Dictionary mapping color strings to color numbers
         cell_size: Size of each cell
@@ -225,57 +406,123 @@ def render_puzzle_state(
     Returns:
         matplotlib Figure object
     """
-    if not matrix or not color_map:
+    plt = _get_mpl()
+    colors, states = _to_arrays(matrix)
+    if colors.size == 0 or not color_map:
         fig, ax = plt.subplots()
         ax.text(0.5, 0.5, "Empty puzzle", ha='center', va='center')
         return fig
     
-    rows, cols = len(matrix), len(matrix[0])
+    rows, cols = colors.shape
     color_lookup = _build_color_lookup(color_map)
-    state_symbols = {1: 'Q', -1: 'X'}
     
     if figsize is None:
         figsize = (cols * cell_size, rows * cell_size)
     
     if font_size is None:
-        font_size = max(8, min(24, int(72 / max(rows, cols))))
+        font_size = _default_font_size(rows, cols)
     
     fig, ax = plt.subplots(figsize=figsize)
-    texts = []
-    
-    # Draw all cells and collect text
-    for i in range(rows):
-        for j in range(cols):
-            color_num, state = matrix[i][j]
-            rgb = color_lookup.get(color_num, (0.5, 0.5, 0.5))
-            y_pos = rows - 1 - i
-            
-            rect = patches.Rectangle(
-                (j, y_pos), 1, 1,
-                linewidth=0.5 if show_grid else 0,
-                edgecolor='black' if show_grid else 'none',
-                facecolor=rgb
-            )
-            ax.add_patch(rect)
-            
-            if state in state_symbols:
-                texts.append((j + 0.5, y_pos + 0.5, state_symbols[state], _get_text_color(rgb)))
-    
-    # Batch add text (more efficient)
-    for x, y, symbol, color in texts:
-        ax.text(x, y, symbol, ha='center', va='center',
-                fontsize=font_size, fontweight='bold', color=color)
-    
-    ax.set_xlim(0, cols)
-    ax.set_ylim(0, rows)
-    ax.set_aspect('equal')
-    ax.axis('off')
+    _draw_cells(ax, colors, color_lookup, show_grid)
+    _draw_symbols(ax, colors, states, color_lookup, font_size)
     plt.tight_layout()
     
     return fig
 
 
-def save_puzzle_image(fig: plt.Figure, filepath: str, dpi: int = 150) -> None:
-    """Save puzzle figure to file and close it."""
+def save_puzzle_image(fig: 'plt.Figure', filepath: str, dpi: int = 150, close: bool = True) -> None:
+    """Save puzzle figure to file and close it (unless close is False)."""
+    plt = _get_mpl()
     fig.savefig(filepath, dpi=dpi, bbox_inches='tight', pad_inches=0.1)
-    plt.close(fig)
\ No newline at end of file
+    if close:
+        plt.close(fig)
+
+
+class PuzzleRenderer:
+    """
+    Render many puzzles onto one reusable Figure/Axes.
+    
+    The figure is created on first use. Puzzles with the same grid size as the
+    previous one only swap the image data and symbols; otherwise the axes are
+    cleared and redrawn. Call close() when done.
+    
+    Example:
+        renderer = PuzzleRenderer(cell_size=0.4)
+        for level, puzzle in puzzles.items():
+            renderer.render(puzzle, puzzle["color_map"], show_state=True)
+            renderer.save(f"puzzle{level}.png")
+        renderer.close()
+    """
+    
+    def __init__(self, cell_size: float = 1.0, show_grid: bool = True):
+        self.cell_size = cell_size
+        self.show_grid = show_grid
+        self.fig: Optional['plt.Figure'] = None
+        self.ax: Optional['plt.Axes'] = None
+        self._image: Optional['AxesImage'] = None
+        self._symbols: List['PathCollection'] = []
+    
+    def render(
+        self,
+        matrix: Matrix,
+        color_map: Dict[str, int],
+        show_state: bool = False,
+        font_size: Optional[int] = None
+    ) -> 'plt.Figure':
+        """
+        Render a puzzle, reusing the figure from previous calls.
+        
+        Args:
+            matrix: 2D matrix where each cell is [color_num, state],
+                    or a puzzle dict with 'colors' and 'states' arrays
+            color_map: Dictionary mapping color strings to color numbers
+            show_state: If True, draw Q/X like render_puzzle_state
+            font_size: Font size for Q/X. Auto-calculated if None.
+        
+        Returns:
+            The shared matplotlib Figure object
+        """
+        colors, states = _to_arrays(matrix)
+        rows, cols = colors.shape
+        
+        if self.fig is None:
+            self.fig, self.ax = _get_mpl().subplots()
+        
+        for collection in self._symbols:
+            collection.remove()
+        self._symbols = []
+        
+        if colors.size == 0 or not color_map:
+            self.ax.cla()
+            self._image = None
+            self.ax.text(0.5, 0.5, "Empty puzzle", ha='center', va='center')
+            return self.fig
+        
+        color_lookup = _build_color_lookup(color_map)
+        self.fig.set_size_inches(cols * self.cell_size, rows * self.cell_size)
+        
+        if self._image is not None and self._image.get_array().shape[:2] == (rows, cols):
+            self._image.set_data(_build_color_image(colors, color_lookup))
+        else:
+            self.ax.cla()
+            self._image = _draw_cells(self.ax, colors, color_lookup, self.show_grid)
+        
+        if show_state:
+            if font_size is None:
+                font_size = _default_font_size(rows, cols)
+            self._symbols = _draw_symbols(self.ax, colors, states, color_lookup, font_size)
+        
+        self.fig.tight_layout()
+        return self.fig
+    
+    def save(self, filepath: str, dpi: int = 150) -> None:
+        """Save the current puzzle to file, keeping the figure for reuse."""
+        if self.fig is not None:
+            save_puzzle_image(self.fig, filepath, dpi=dpi, close=False)
+    
+    def close(self) -> None:
+        """Close the shared figure."""
+        if self.fig is not None:
+            _get_mpl().close(self.fig)
+        self.fig = self.ax = self._image = None
+        self._symbols = []
\ No newline at end of file
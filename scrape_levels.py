@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Download Queens puzzle data: HTML, screenshot, JSON, and index SSV file for each level.
-Also converts puzzles to matrix format and stores in puzzles.pkl for fast querying.
+Also converts puzzles to matrix format and stores in puzzles.npz for fast querying.
 
 Interactive options:
  1) Download all levels
@@ -12,15 +12,44 @@ At the end, report successes and failures with reasons.
 Logs saved to 'logs/levels_download.log'.
 """
 from pathlib import Path
+import asyncio
 import re
-import json
 import csv
+from functools import partial
 import pickle
 import random
 import logging
-from typing import List, Optional, Tuple, Dict, Any
-from playwright.sync_api import sync_playwright, Page
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
+from Helper import load_npz, save_npz
+from typing import TYPE_CHECKING, List, Optional, Tuple, Dict, Any
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Page
+
+
+_BG_RE = re.compile(r"background-color\s*:\s*([^;]+)")
+_LEVEL_RE = re.compile(r"/level/(\d+)")
+_SQUARE_XPATH = "descendant::div[contains(concat(' ', normalize-space(@class), ' '), ' square ')]"
+
+# All level link hrefs in one round-trip instead of one get_attribute call per anchor
+_LEVEL_HREFS_JS = """
+() => Array.from(document.querySelectorAll('a[href^="/level/"]')).map(a => a.getAttribute('href'))
+"""
+
+# Same extraction as html_to_json, done in the browser in a single DOM walk
+_EXTRACT_GRID_JS = """
+el => ({
+    html: el.innerHTML,
+    squares: Array.from(el.querySelectorAll('div.square')).map(d => ({
+        row: parseInt(d.dataset.row ?? '-1', 10),
+        col: parseInt(d.dataset.col ?? '-1', 10),
+        color: d.style.backgroundColor.trim(),
+        borders: Array.from(d.classList).filter(c => c.includes('thick-border'))
+    }))
+})
+"""
 
 
 # Configure logging
@@ -44,16 +73,19 @@ def html_to_json(html: str) -> List[dict]:
     """
     Parse HTML of the puzzle grid and extract each square's
     row, column, background color, and any thick-border classes.
+    Used for re-parsing saved HTML files; live pages use _EXTRACT_GRID_JS.
     """
-    soup = BeautifulSoup(html, 'html.parser')
+    import lxml.html  # only needed for offline re-parsing
+
+    root = lxml.html.fragment_fromstring(html, create_parent='div')
     data = []
-    for div in soup.select('div.square'):
+    for div in root.xpath(_SQUARE_XPATH):
         row = int(div.get('data-row', -1))
         col = int(div.get('data-col', -1))
         style = div.get('style', '')
-        m = re.search(r"background-color\s*:\s*([^;]+)", style)
+        m = _BG_RE.search(style)
         color = m.group(1).strip() if m else ''
-        classes = div.get('class', []) or []
+        classes = (div.get('class') or '').split()
         borders = [cls for cls in classes if 'thick-border' in cls]
         data.append({'row': row, 'col': col, 'color': color, 'borders': borders})
     return data
@@ -67,46 +99,47 @@ def convert_puzzle(json_data: List[dict]) -> Dict[str, Any]:
         json_data: List of cell dictionaries with row, col, color, borders
         
     Returns:
-        Dictionary with 'matrix' and 'color_map' keys
+        Dictionary with 'colors' (uint8[rows, cols]), 'states' (int8[rows, cols])
+        and 'color_map' keys
     """
     if not json_data:
-        return {"matrix": [], "color_map": {}}
+        return {
+            "colors": np.zeros((0, 0), dtype=np.uint8),
+            "states": np.zeros((0, 0), dtype=np.int8),
+            "color_map": {}
+        }
     
-    # Single pass: find dimensions and unique colors
-    max_row = max_col = 0
-    seen_colors = set()
-    unique_colors = []
+    # Cell coordinates as one (N, 2) array; dimensions from a single reduction
+    coords = np.array([(cell['row'], cell['col']) for cell in json_data], dtype=np.intp)
+    rows, cols = (coords.max(axis=0) + 1).tolist()
+    cell_colors = [cell['color'] for cell in json_data]
     
-    for cell in json_data:
-        row, col, color = cell['row'], cell['col'], cell['color']
-        
-        if row > max_row:
-            max_row = row
-        if col > max_col:
-            max_col = col
-        
-        if color not in seen_colors:
-            seen_colors.add(color)
-            unique_colors.append(color)
+    # Unique colors in first-seen order (dicts preserve insertion order)
+    unique_colors = list(dict.fromkeys(cell_colors))
     
     # Randomly assign integers 1 to N
     num_colors = len(unique_colors)
     random_numbers = random.sample(range(1, num_colors + 1), num_colors)
     color_map = dict(zip(unique_colors, random_numbers))
     
-    # Build matrix
-    rows, cols = max_row + 1, max_col + 1
-    matrix = [[[0, 0] for _ in range(cols)] for _ in range(rows)]
-    
-    for cell in json_data:
-        matrix[cell['row']][cell['col']] = [color_map[cell['color']], 0]
+    # Build color and state arrays (one fancy-index assignment for all cells)
+    colors = np.zeros((rows, cols), dtype=np.uint8)
+    vs = np.fromiter((color_map[c] for c in cell_colors), dtype=np.uint8, count=len(cell_colors))
+    colors[coords[:, 0], coords[:, 1]] = vs
     
     return {
-        "matrix": matrix,
+        "colors": colors,
+        "states": np.zeros_like(colors, dtype=np.int8),
         "color_map": color_map
     }
 
 
+def write_json(json_path: Path, json_data: List[dict], pretty: bool = False) -> None:
+    """Serialize puzzle JSON data as compact UTF-8 (indented if pretty) and write it to file."""
+    option = orjson.OPT_INDENT_2 if pretty else 0
+    json_path.write_bytes(orjson.dumps(json_data, option=option))
+
+
 def load_pickle(pickle_path: Path) -> Dict[int, Dict[str, Any]]:
     """Load existing pickle file or return empty dict."""
     if pickle_path.exists():
@@ -115,31 +148,50 @@ def load_pickle(pickle_path: Path) -> Dict[int, Dict[str, Any]]:
     return {}
 
 
-def save_pickle(pickle_path: Path, data: Dict[int, Dict[str, Any]]) -> None:
-    """Save data to pickle file."""
-    with open(pickle_path, 'wb') as f:
-        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
-
-
-def update_pickle(pickle_path: Path, level: int, puzzle_data: Dict[str, Any]) -> None:
-    """Add or update a single puzzle in the pickle file."""
-    data = load_pickle(pickle_path)
-    data[level] = puzzle_data
-    save_pickle(pickle_path, data)
+class PuzzleStore:
+    """
+    Context manager around the puzzles npz file.
+    Loads the file once on enter and writes it back once on exit.
+    If the npz file does not exist yet, puzzles from legacy_pickle_path are loaded instead.
+    """
+    
+    def __init__(self, npz_path: Path, legacy_pickle_path: Optional[Path] = None):
+        self.npz_path = npz_path
+        self.legacy_pickle_path = legacy_pickle_path
+        self.data: Dict[int, Dict[str, Any]] = {}
+    
+    def __enter__(self) -> "PuzzleStore":
+        if not self.npz_path.exists() and self.legacy_pickle_path is not None:
+            self.data = load_pickle(self.legacy_pickle_path)
+        else:
+            self.data = load_npz(self.npz_path)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
+    
+    def update(self, level: int, puzzle_data: Dict[str, Any]) -> None:
+        """Add or update a single puzzle in memory."""
+        self.data[level] = puzzle_data
+    
+    def flush(self) -> None:
+        """Write the in-memory puzzles to the npz file."""
+        if self.data:
+            save_npz(self.npz_path, self.data)
+            logging.info(f"Saved puzzle data to {self.npz_path} ({len(self.data)} puzzles)")
 
 
-def fetch_levels(page: Page, link: str) -> Optional[List[int]]:
+async def fetch_levels(page: 'Page', link: str) -> Optional[List[int]]:
     """
     Navigate to the homepage and extract available level numbers.
     Returns a sorted list of level IDs.
     """
     logging.info(f"Fetching levels from {link}")
-    page.goto(link, wait_until='networkidle')
-    anchors = page.query_selector_all('a[href^="/level/"]')
+    await page.goto(link, wait_until='networkidle')
+    hrefs = await page.evaluate(_LEVEL_HREFS_JS)
     levels = []
-    for a in anchors:
-        href = a.get_attribute('href') or ''
-        m = re.search(r"/level/(\d+)", href)
+    for href in hrefs:
+        m = _LEVEL_RE.search(href or '')
         if m:
             levels.append(int(m.group(1)))
     levels = sorted(set(levels))
@@ -150,15 +202,22 @@ def fetch_levels(page: Page, link: str) -> Optional[List[int]]:
     return levels
 
 
-def download_puzzle(page: Page, link: str, levels: List[int], base_dir: Path) -> None:
+async def download_puzzle(
+    browser: 'Browser',
+    link: str,
+    levels: List[int],
+    base_dir: Path,
+    concurrency: int = 8
+) -> None:
     """
     For each level, save HTML, screenshot, JSON, convert to matrix,
-    update pickle file, update index SSV file, and report success/failure.
+    update puzzles file, update index SSV file, and report success/failure.
+    Up to `concurrency` levels are fetched at the same time, each in its own page.
     """
     html_dir = base_dir / "html"
     img_dir = base_dir / "pictures"
     json_dir = base_dir / "json"
-    pickle_path = base_dir / "puzzles.pkl"
+    puzzles_path = base_dir / "puzzles.npz"
     
     for d in (html_dir, img_dir, json_dir):
         d.mkdir(parents=True, exist_ok=True)
@@ -169,50 +228,62 @@ def download_puzzle(page: Page, link: str, levels: List[int], base_dir: Path) ->
     failures: List[Tuple[int, str]] = []
     index_rows: List[Tuple[int, str, str, str]] = []
 
-    # Load existing pickle data once
-    pickle_data = load_pickle(pickle_path)
+    # One browser context per worker; a page is checked out for each level
+    contexts = [await browser.new_context() for _ in range(max(1, min(concurrency, len(levels))))]
+    pages: asyncio.Queue = asyncio.Queue()
+    for context in contexts:
+        pages.put_nowait(await context.new_page())
+
+    # File writes run on a thread pool so they don't stall the event loop
+    executor = ThreadPoolExecutor(max_workers=4)
+    loop = asyncio.get_running_loop()
 
-    for lvl in levels:
+    async def fetch_one(lvl: int, store: PuzzleStore) -> None:
+        page = await pages.get()
+        writes: List[asyncio.Future] = []
         try:
             logging.info(f"Processing level {lvl}")
-            page.goto(f"{link}level/{lvl}", wait_until='networkidle')
+            await page.goto(f"{link}level/{lvl}", wait_until='networkidle')
 
-            grid_el = page.query_selector(selector) or page.query_selector(fallback)
+            grid_el = await page.query_selector(selector) or await page.query_selector(fallback)
             if not grid_el:
                 reason = "Puzzle container not found"
                 logging.warning(f"Level {lvl} failed: {reason}")
                 failures.append((lvl, reason))
-                continue
+                return
+
+            # Fetch HTML and parsed squares in one round-trip
+            grid = await grid_el.evaluate(_EXTRACT_GRID_JS)
+            html_content = grid['html']
+            json_data = grid['squares']
 
-            # Save HTML
-            html_content = grid_el.inner_html()
+            # Save HTML and JSON in the background
             html_file = html_dir / f"puzzle{lvl}.html"
-            html_file.write_text(html_content, encoding='utf-8')
+            json_file = json_dir / f"puzzle{lvl}.json"
+            writes = [
+                loop.run_in_executor(executor, partial(html_file.write_text, html_content, encoding='utf-8')),
+                loop.run_in_executor(executor, write_json, json_file, json_data),
+            ]
 
             # Save image
             img_file = img_dir / f"puzzle{lvl}.png"
-            grid_el.screenshot(path=str(img_file))
-
-            # Parse HTML to JSON data
-            json_data = html_to_json(html_content)
-            
-            # Save JSON
-            json_file = json_dir / f"puzzle{lvl}.json"
-            json_file.write_text(json.dumps(json_data, ensure_ascii=False, indent=2), encoding='utf-8')
+            await grid_el.screenshot(path=str(img_file))
 
-            # Convert to matrix and add to pickle data
+            # Convert to matrix and add to puzzle data
             puzzle_data = convert_puzzle(json_data)
-            pickle_data[lvl] = puzzle_data
+            store.update(lvl, puzzle_data)
             logging.info(f"Level {lvl} converted to matrix format")
 
             # Determine grid size
             if json_data:
-                max_row = max(item['row'] for item in json_data)
-                max_col = max(item['col'] for item in json_data)
-                size_str = f"{max_row+1} by {max_col+1}"
+                rows, cols = puzzle_data["colors"].shape
+                size_str = f"{rows} by {cols}"
             else:
                 size_str = ''
 
+            # Surface write errors before reporting the level as done
+            await asyncio.gather(*writes)
+
             index_rows.append((lvl, str(img_file), str(json_file), size_str))
             successes.append(lvl)
             logging.info(f"Level {lvl} downloaded successfully")
@@ -221,11 +292,26 @@ def download_puzzle(page: Page, link: str, levels: List[int], base_dir: Path) ->
             reason = str(e)
             logging.error(f"Level {lvl} failed: {reason}", exc_info=True)
             failures.append((lvl, reason))
-
-    # Save pickle file once at the end (more efficient than per-level)
-    if pickle_data:
-        save_pickle(pickle_path, pickle_data)
-        logging.info(f"Saved puzzle data to {pickle_path} ({len(pickle_data)} puzzles)")
+            # An earlier step failed; still collect any background writes
+            for result in await asyncio.gather(*writes, return_exceptions=True):
+                if isinstance(result, Exception):
+                    logging.error(f"Level {lvl} write failed: {result}")
+        finally:
+            pages.put_nowait(page)
+
+    # Load existing puzzle data once, save it once at the end
+    try:
+        with PuzzleStore(puzzles_path, legacy_pickle_path=base_dir / "puzzles.pkl") as store:
+            await asyncio.gather(*(fetch_one(lvl, store) for lvl in levels))
+    finally:
+        executor.shutdown(wait=True)
+        for context in contexts:
+            await context.close()
+
+    # Levels finish out of order; report them sorted
+    successes.sort()
+    failures.sort()
+    index_rows.sort()
 
     # Write index SSV
     if index_rows:
@@ -240,7 +326,7 @@ def download_puzzle(page: Page, link: str, levels: List[int], base_dir: Path) ->
     print("\nDownload Report:")
     print(f"  Successful levels: {len(successes)}")
     print(f"  Failed levels: {len(failures)}")
-    print(f"  Total puzzles in pickle: {len(pickle_data)}")
+    print(f"  Total puzzles stored: {len(store.data)}")
     if failures:
         print("  Failure details:")
         for lvl, reason in failures:
@@ -284,26 +370,26 @@ def read_missing_levels(base_dir: Path, available: List[int]) -> List[int]:
     if not ssv.exists():
         print("index.ssv not found. Downloading all levels.")
         return available
-    existing = []
     with ssv.open('r', encoding='utf-8') as f:
-        reader = csv.DictReader(f, delimiter=';')
-        for row in reader:
-            existing.append(int(row['level']))
+        existing = {int(row['level']) for row in csv.DictReader(f, delimiter=';')}
     missing = [lvl for lvl in available if lvl not in existing]
     print(f"Missing levels: {missing}")
     return missing
 
 
-def main():
+async def main():
+    from playwright.async_api import async_playwright
+
     setup_logging()
     link = "https://queensgame.vercel.app/"
     base_dir = Path('levels')
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
 
-        available = fetch_levels(page, link) or []
+        available = await fetch_levels(page, link) or []
+        await page.close()
         if not available:
             logging.error("No levels found. Exiting.")
             return
@@ -320,9 +406,9 @@ def main():
                 return
 
         logging.info(f"Levels to download: {to_download}")
-        download_puzzle(page, link, to_download, base_dir)
-        browser.close()
+        await download_puzzle(browser, link, to_download, base_dir)
+        await browser.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file